@@ -1,16 +1,28 @@
 """
 Main entry point for the booking system. 
 Initializes the Booking class and retrieves available slots.
+
+Heavy modules (booking, requests, aiohttp) are imported only after the .env
+configuration has been validated, so config errors and quick commands
+return without paying their import cost.
 """
+import time
+
+# taken before the remaining imports so --startup-report includes their cost
+SCRIPT_STARTED_AT = time.perf_counter()
+
 from datetime import date, datetime
+import argparse
+import importlib
 import os
 
 from dotenv import find_dotenv, load_dotenv
-import asyncio
+import json
 import math
 import sys
-from booking import Booking
+from constants import MAPPING_FILE
 from errors import LoginException, BookingException
+from planner import check_constraints, parse_rooms
 
 
 ROOMS_PER_PAGE = 5
@@ -26,10 +38,16 @@ MAGENTA = "\033[35m"
 BLUE = "\033[34m"
 RED = "\033[31m"
 
+STARTUP_MODULES = ("asyncio", "requests", "aiohttp", "auth", "booking")
+
 
-def display_timeslots(slots):
+def display_timeslots(slots, prompt=input):
     """Display rooms and timeslots in a paginated terminal HUD.
 
+    Args:
+        slots: Mapping of room names to their available timeslots.
+        prompt: Function used to read each HUD command, input() by default.
+
     Returns:
         Selected room name when user chooses via HUD index, otherwise None.
     """
@@ -73,7 +91,7 @@ def display_timeslots(slots):
             f"{YELLOW}[index]{RESET} book room  "
             f"{YELLOW}[q]{RESET} quit"
         )
-        command = input(f"{BOLD}HUD>{RESET} ").strip().lower()
+        command = prompt(f"{BOLD}HUD>{RESET} ").strip().lower()
         if command in {"q", "quit", "exit"}:
             return None
         if command.isdigit():
@@ -99,13 +117,23 @@ async def main():
     """
     Main function to initialize the booking system and retrieve available slots.
     """
+    from booking import Booking
+    from console import read_line, run_in_daemon_thread
+
     booking = Booking()
-    await booking.get_slots()
-    selected_room = display_timeslots(booking.slots)
-    if not selected_room:
-        print(f"{YELLOW}No room selected. Exiting.{RESET}")
-        return
-    booking.book(room_name=selected_room)
+    try:
+        await booking.get_slots()
+        while True:
+            selected_room = await run_in_daemon_thread(display_timeslots, booking.slots, read_line)
+            if not selected_room:
+                break
+            if await booking.book(room_name=selected_room):
+                print(f"{DIM}Booking runs in the background. Select another room or q to finish.{RESET}")
+        if not booking.pending_bookings:
+            print(f"{YELLOW}No room selected. Exiting.{RESET}")
+        await booking.wait_for_bookings()
+    finally:
+        await booking.close()
 
 def handle_env_errors():
     """Checks for .env file and required variables, printing warnings or errors as needed."""
@@ -144,8 +172,112 @@ def handle_env_errors():
             print(f"{RED}Error: Invalid date format. Please use the format 'DD MMM YYYY'.{RESET}")
             sys.exit(1)
 
+    min_duration_raw = os.getenv("MIN_DURATION_MINUTES")
+    if min_duration_raw and (not min_duration_raw.isdigit() or int(min_duration_raw) <= 0):
+        print(f"{RED}Error: MIN_DURATION_MINUTES must be a positive whole number of minutes.{RESET}")
+        sys.exit(1)
+
+    try:
+        with open(MAPPING_FILE, "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+    except (OSError, ValueError):
+        print(f"{RED}Error: Could not read {MAPPING_FILE}.{RESET}")
+        sys.exit(1)
+    try:
+        check_constraints(
+            mapping,
+            parse_rooms(os.getenv("ROOMS")),
+            start_time_raw or "07:00",
+            end_time_raw or "22:00",
+            int(min_duration_raw or 0),
+        )
+    except ValueError as e:
+        print(f"{RED}Error: {e}{RESET}")
+        sys.exit(1)
+
+def report_startup_cost(started_at: float):
+    """
+    Imports the heavy runtime modules one by one and prints how long each took,
+    similar to `python -X importtime` but limited to what the booking flow needs.
+
+    Args:
+        started_at: time.perf_counter() value captured before the script's own imports.
+    """
+    config_ms = (time.perf_counter() - started_at) * 1000
+    print(f"{BLUE}{BOLD}Startup report{RESET}")
+    print(f"  {'base + config':<14} {config_ms:8.1f} ms")
+    total_ms = config_ms
+    for module_name in STARTUP_MODULES:
+        already_loaded = module_name in sys.modules
+        module_started_at = time.perf_counter()
+        importlib.import_module(module_name)
+        module_ms = (time.perf_counter() - module_started_at) * 1000
+        total_ms += module_ms
+        note = f" {DIM}(already loaded){RESET}" if already_loaded else ""
+        print(f"  {module_name:<14} {module_ms:8.1f} ms{note}")
+    print(f"  {BOLD}{'total':<14} {total_ms:8.1f} ms{RESET}")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line flags for the quick, network-free commands."""
+    parser = argparse.ArgumentParser(prog="python .", description="SIT RBS booking CLI")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="validate the .env configuration and exit without logging in",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print the import cost of each startup phase and exit",
+    )
+    capture_group = parser.add_mutually_exclusive_group()
+    capture_group.add_argument(
+        "--record",
+        metavar="ARCHIVE",
+        help="record redacted HTTP traffic into a gzip-compressed archive",
+    )
+    capture_group.add_argument(
+        "--replay",
+        metavar="ARCHIVE",
+        help="replay HTTP traffic from a recorded archive instead of the network",
+    )
+    parser.add_argument(
+        "--replay-repeat-last",
+        action="store_true",
+        help="with --replay, keep serving the last response of a URL once its recording runs out",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     handle_env_errors()
+    if args.startup_report:
+        report_startup_cost(SCRIPT_STARTED_AT)
+        sys.exit(0)
+    if args.check:
+        print(f"{GREEN}Configuration OK.{RESET}")
+        sys.exit(0)
+    if args.record or args.replay:
+        import capture
+
+        if args.record:
+            try:
+                capture.start_recording(args.record)
+            except OSError as e:
+                print(f"{RED}Could not open recording: {e}{RESET}")
+                sys.exit(1)
+            print(f"{DIM}Recording HTTP traffic to {args.record}{RESET}")
+        else:
+            try:
+                capture.start_replay(args.replay, repeat_last=args.replay_repeat_last)
+            except OSError as e:
+                print(f"{RED}Could not open recording: {e}{RESET}")
+                sys.exit(1)
+            print(f"{DIM}Replaying HTTP traffic from {args.replay}{RESET}")
+    import asyncio
+
     dotenv_path = find_dotenv(usecwd=True)
     try:
         asyncio.run(main())
@@ -16,6 +16,8 @@ from constants import (
     REQUEST_TIMEOUT_SECONDS
 )
 from errors import LoginException
+import capture
+from scheduler import Priority, request_scheduler
 
 
 class LoginURLInfo(TypedDict):
@@ -28,7 +30,7 @@ class LoginURLInfo(TypedDict):
 class Auth:
     """Handles the authentication process for the booking system."""
     def __init__(self):
-        self.session = requests.Session()
+        self.session = capture.wrap_session(requests.Session())
         self.token = ""
 
     def __call__(self, username: str, password: str):
@@ -38,12 +40,13 @@ class Auth:
     def login(self, username: str, password: str):
         """Performs the login process using the provided username and password."""
         info = self._get_login_url(username, password)
-        final_response = self.session.post(
-            info["action_url"],
-            data=info["wsfed_payload"],
-            headers=info["callback_headers"],
-            timeout=REQUEST_TIMEOUT_SECONDS
-        )
+        with request_scheduler.slot_sync(Priority.LOGIN):
+            final_response = self.session.post(
+                info["action_url"],
+                data=info["wsfed_payload"],
+                headers=info["callback_headers"],
+                timeout=REQUEST_TIMEOUT_SECONDS
+            )
         final_response.raise_for_status()
         if final_response.status_code == 200:
             if "Sign In" in final_response.text or "adfs/ls" in final_response.url:
@@ -57,7 +60,10 @@ class Auth:
             "Kmsi": "true",
         }
         adfs_url = self._get_adfs_url()
-        login_response = self.session.post(adfs_url, data=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+        with request_scheduler.slot_sync(Priority.LOGIN):
+            login_response = self.session.post(
+                adfs_url, data=payload, timeout=REQUEST_TIMEOUT_SECONDS
+            )
         login_response.raise_for_status()
         if "Incorrect user ID or password" in login_response.text:
             raise LoginException("Incorrect user ID or password.")
@@ -78,14 +84,16 @@ class Auth:
 
     def _get_adfs_url(self) -> str:
         self.session.headers.update(HEADERS)
-        response = self.session.get(START_URL, timeout=REQUEST_TIMEOUT_SECONDS)
+        with request_scheduler.slot_sync(Priority.LOGIN):
+            response = self.session.get(START_URL, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
         if "Sign In" not in response.text and "adfs/ls" not in response.url:
             raise LoginException("ADFS URL not found on initial login page.")
         return response.url
 
     def _get_verification_token(self) -> None:
-        response = self.session.get(START_URL, timeout=REQUEST_TIMEOUT_SECONDS)
+        with request_scheduler.slot_sync(Priority.LOGIN):
+            response = self.session.get(START_URL, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
 
         token_match = re.search(REQUEST_VERIFICATION_TOKEN_REGEX, response.text)
@@ -1,11 +1,11 @@
 """Handles the booking process, including retrieving available slots and making reservations."""
 
-from asyncio import gather, to_thread, create_task
+from asyncio import Lock, Task, gather, get_running_loop, to_thread, create_task
 from datetime import date
 import json
 import re
 import os
-from typing import TypeAlias
+from typing import TypeAlias, TypedDict
 import requests
 import aiohttp
 from auth import Auth
@@ -30,17 +30,29 @@ from constants import (
     MAPPING_FILE,
     BOOKING_URL,
     BOOKING_HEADER,
+    BOOKING_CONNECT_TIMEOUT_SECONDS,
+    BOOKING_READ_TIMEOUT_SECONDS,
     REQUEST_TIMEOUT_SECONDS,
     GET_ALL_ROOMS_URL,
     CONFIRM_URL,
     FINALIZE_URL,
 )
 from errors import BookingException
+import capture
+from console import ainput
+from planner import (
+    estimate_bytes_saved,
+    has_contiguous_run,
+    parse_rooms,
+    plan_availability_query,
+)
+from scheduler import Priority, request_scheduler
 
 USERNAME: TypeAlias = str
 PASSWORD: TypeAlias = str
 MAPPING: TypeAlias = dict[str, str]
 SESSIONPOOL: TypeAlias = list[tuple[requests.Session, str]]
+ASYNCSESSIONPOOL: TypeAlias = list[tuple[aiohttp.ClientSession, str]]
 
 RESET = "\033[0m"
 BOLD = "\033[1m"
@@ -52,25 +64,40 @@ MAGENTA = "\033[35m"
 RED = "\033[31m"
 
 
+class BookingPayloads(TypedDict):
+    """TypedDict to hold the prebuilt confirm and finalize payloads of one booking."""
+    confirm: dict[str, str]
+    finalize: dict[str, str]
+    slots: list[dict[str, str]]
+
+
 class Booking:
     """Handles the booking process, including retrieving available slots and making reservations."""
 
     def __init__(self):
         self.session_pool: SESSIONPOOL = []
+        self.async_pool: ASYNCSESSIONPOOL = []
+        self.booking_locks: list[Lock] = []
+        self.pending_bookings: list[Task] = []
+        self._booking_session_index = 0
         self.mapping: MAPPING = {}
         self.rsrc_list: list[MAPPING] = []
         self.slots = {}
         self.date = os.getenv("DATE", date.today().strftime("%d %b %Y"))
         self.default_slot_start_time = os.getenv("DEFAULT_SLOT_START_TIME", "07:00")
         self.default_slot_end_time = os.getenv("DEFAULT_SLOT_END_TIME", "22:00")
+        self.rooms = parse_rooms(os.getenv("ROOMS"))
+        self.min_duration_minutes = int(os.getenv("MIN_DURATION_MINUTES", "0") or 0)
 
     async def get_slots(self):
         """
         1. Logins to the booking system,
         2. builds a pool of authenticated sessions,
         3. retrieves room mappings
-        4. checks availability for all rooms.
+        4. checks availability for all rooms on aiohttp sessions
+           that stay open for booking until close() is called.
         """
+        request_scheduler.bind(get_running_loop())
         print(f"{CYAN}{BOLD}[*] Logging in{RESET}")
         await self._build_session_pool()
         print(f"{GREEN}{BOLD}[*] Login successful, building session pool{RESET}")
@@ -87,34 +114,42 @@ class Booking:
                 raise BookingException("Could not determine RSRC_TYP_ID from fetched room metadata.")
         except requests.RequestException as e:
             raise BookingException(f"Failed to fetch rooms: {e}") from e
+        self.async_pool = [
+            (self._create_async_session(request_session), token)
+            for request_session, token in self.session_pool
+        ]
+        self.booking_locks = [Lock() for _ in self.async_pool]
         print(f"{CYAN}[*] Checking availability{RESET}")
         await self._check_availability()
 
-    def book(self, room_name: str | None = None):
+    async def book(self, room_name: str | None = None) -> Task | None:
         """
-        prompts the user to select a room and time slots,
-        then attempts to make a booking using one of the authenticated sessions from the pool.
+        prompts the user to select a room and time slots, prebuilds the booking payloads
+        and starts the confirm/finalize pipeline in the background on the shared async client.
+
+        Returns:
+            The running booking task, or None if nothing was booked.
         """
-        session, token = self.session_pool[0]
         if room_name is None:
-            room_name = input(
+            room_name = (await ainput(
                 f"{BOLD}Enter room name{RESET} (E2-XX-XXX-DRXXX): "
-            ).strip().upper()
+            )).strip().upper()
         else:
             room_name = room_name.strip().upper()
             print(f"{CYAN}[*] Selected room from HUD:{RESET} {MAGENTA}{room_name}{RESET}")
 
-        room_slots = self.slots.get(room_name, [])
+        # snapshot of what the HUD showed, background bookings may change self.slots meanwhile
+        room_slots = list(self.slots.get(room_name, []))
         if not room_slots:
             print(f"{RED}Room '{room_name}' not found or has no available slots.{RESET}")
-            return
+            return None
 
         max_slot_index = len(room_slots) - 1
         while True:
-            slot_input = input(
+            slot_input = (await ainput(
                 f"{BOLD}Enter slot numbers to book{RESET} (comma-separated, e.g., 0,1,2) \
     or ('-' for a range, e.g., 0-2): "
-            ).strip()
+            )).strip()
 
             try:
                 if "-" in slot_input:
@@ -146,42 +181,90 @@ class Booking:
                         f"{RED}Invalid slot index.{RESET} Enter values between 0 and {max_slot_index}."
                     )
                     continue
-
-                self._confirm_booking(room_name, slot_indices, token, session)
                 break
             except ValueError:
                 print(
                     f"{RED}Invalid slot input format.{RESET} Please enter numbers separated by commas or a range with '-'."
                 )
 
-    def _confirm_booking(
-        self,
-        room_name: str,
-        slot_indices: list[int],
-        token: str,
-        session: requests.Session,
-    ):
+        selected_slots = [room_slots[i] for i in slot_indices]
+        try:
+            self._reserve_slots(room_name, selected_slots)
+        except BookingException as e:
+            print(f"{RED}[!] {e}{RESET}")
+            return None
+        session, token, lock = self._next_async_session()
+        payloads = self._build_booking_payloads(room_name, selected_slots, token)
+        task = create_task(self._run_booking(room_name, payloads, session, lock))
+        self.pending_bookings.append(task)
+        return task
+
+    async def wait_for_bookings(self):
+        """Waits for every booking started with book() to finish."""
+        if self.pending_bookings:
+            print(f"{CYAN}[*] Waiting for {len(self.pending_bookings)} booking(s) to finish...{RESET}")
+        await gather(*self.pending_bookings)
+        self.pending_bookings.clear()
+
+    async def close(self):
+        """Closes the shared aiohttp sessions."""
+        await gather(*(s.close() for s, _ in self.async_pool))
+        self.async_pool = []
+
+    def _next_async_session(self) -> tuple[aiohttp.ClientSession, str, Lock]:
+        """
+        Picks the next shared aiohttp session in round-robin order, spreading concurrent
+        bookings across logins since confirm/finalize state is kept per login on the server.
+        The returned lock must be held from confirm to finalize.
+        """
+        if not self.async_pool:
+            raise BookingException("No authenticated session available for booking.")
+        index = self._booking_session_index % len(self.async_pool)
+        self._booking_session_index += 1
+        session, token = self.async_pool[index]
+        return session, token, self.booking_locks[index]
+
+    def _reserve_slots(self, room_name: str, slots: list[dict[str, str]]):
+        """
+        Takes the chosen slots out of self.slots while their booking runs, so the HUD
+        cannot offer them to a second booking.
+
+        Raises:
+            BookingException: when a chosen slot is no longer available, e.g. because
+                another booking took it while the user was choosing.
+        """
+        available = self.slots.get(room_name, [])
+        available_ids = {slot["slot_id"] for slot in available}
+        missing = [slot["time"] for slot in slots if slot["slot_id"] not in available_ids]
+        if missing:
+            raise BookingException(
+                f"Slot(s) {', '.join(missing)} in {room_name} are no longer available."
+            )
+        chosen_ids = {slot["slot_id"] for slot in slots}
+        remaining = [slot for slot in available if slot["slot_id"] not in chosen_ids]
+        if remaining:
+            self.slots[room_name] = remaining
+        else:
+            self.slots.pop(room_name, None)
+
+    def _release_slots(self, room_name: str, slots: list[dict[str, str]]):
+        """Puts the slots of a failed booking back into self.slots."""
+        room_slots = self.slots.get(room_name, []) + slots
+        self.slots[room_name] = sorted(room_slots, key=lambda slot: slot["time"])
+
+    def _build_booking_payloads(
+        self, room_name: str, slots: list[dict[str, str]], token: str
+    ) -> BookingPayloads:
         """
-        Confirms the booking for the selected room and time slots.
+        Builds the confirm and finalize payloads for the selected room and time slots.
 
         Args:
             room_name: The name of the room to book.
-            slot_indices: A list of indices corresponding to the time slots to book.
-            token: The verification token required for booking.
-            session: An authenticated requests.Session to use for making booking requests.
+            slots: The time slots to book, as shown to the user.
+            token: The verification token of the session that will send the payloads.
         """
-        print(f"{MAGENTA}[*] Attempting to book{RESET} {room_name} {DIM}for slots {slot_indices}{RESET}")
-        if room_name not in self.slots:
-            print(f"{RED}Room '{room_name}' not found or has no available slots.{RESET}")
-            return
-        room_slots = self.slots.get(room_name, [])
-        if not slot_indices or any(i < 0 or i >= len(room_slots) for i in slot_indices):
-            print(f"{RED}Invalid slot indices.{RESET}")
-            return
-
         slot_list = []
-        for i, idx in enumerate(slot_indices):
-            slot_info = room_slots[idx]
+        for i, slot_info in enumerate(slots):
             slot_list.append(
                 {
                     "SRNO": i + 1,
@@ -193,8 +276,8 @@ class Booking:
                     "encryptedSLT_Time": None,
                 }
             )
-        first_slot = room_slots[slot_indices[0]]["rsrc_id"]
-        booking_payload = {
+        first_slot = slots[0]["rsrc_id"]
+        confirm = {
             "__RequestVerificationToken": token,
             "RSRC_ID": first_slot,
             "RSRC_TYP_ID": self.rsrc_list[0]["RSRC_TYP_ID"],
@@ -207,101 +290,190 @@ class Booking:
             "IS_SUPT": CONFIRMATION_IS_SUPT,
             "IS_APPRVL": CONFIRMATION_IS_APPRVL,
         }
+        finalize = {
+            "__RequestVerificationToken": token,
+            "RSRC_TYP_ID": self.rsrc_list[0]["RSRC_TYP_ID"],
+            "NUM_ATTND": FINALIZE_NUM_ATTND,
+            "Event_TypeText": "",
+            "Acad_Text": "",
+            "Purpose": FINALIZE_PURPOSE,
+            "supptList": FINALIZE_SUPPT_LIST,
+            "OVERWRITE": FINALIZE_OVERWRITE,
+            "slcPurpose": "",
+        }
+        return BookingPayloads(
+            confirm=confirm,
+            finalize=finalize,
+            slots=slots,
+        )
+
+    async def _run_booking(
+        self,
+        room_name: str,
+        payloads: BookingPayloads,
+        session: aiohttp.ClientSession,
+        lock: Lock,
+    ):
+        """
+        Runs one booking in the background, reporting failures instead of raising
+        so other bookings and the HUD keep going. Holds the session's lock so no other
+        confirm can land between this booking's confirm and finalize, and releases the
+        reserved slots again if the booking does not go through.
+        """
+        booked = False
         try:
-            response = session.post(CONFIRM_URL, data=booking_payload)
-            response.raise_for_status()
-            if response.status_code == 200:
-                print(f"{CYAN}[*] Finalizing booking...{RESET}")
-                payload = {
-                    "__RequestVerificationToken": token,
-                    "RSRC_TYP_ID": self.rsrc_list[0]["RSRC_TYP_ID"],
-                    "NUM_ATTND": FINALIZE_NUM_ATTND,
-                    "Event_TypeText": "",
-                    "Acad_Text": "",
-                    "Purpose": FINALIZE_PURPOSE,
-                    "supptList": FINALIZE_SUPPT_LIST,
-                    "OVERWRITE": FINALIZE_OVERWRITE,
-                    "slcPurpose": "",
-                }
-                response = session.post(FINALIZE_URL, data=payload, timeout=REQUEST_TIMEOUT_SECONDS)
-                response.raise_for_status()
-                if response.status_code != 200:
-                    raise BookingException(
-                        f"Failed to finalize booking: {response.status_code} {response.text}"
-                    )
-                print(f"{GREEN}{BOLD}[+] Booking successful!{RESET}")
-        except requests.RequestException as e:
+            async with lock:
+                await self._confirm_booking(room_name, payloads, session)
+            booked = True
+        except BookingException as e:
+            print(f"{RED}[!] Booking failed for {room_name}: {e}{RESET}")
+        finally:
+            if not booked:
+                self._release_slots(room_name, payloads["slots"])
+
+    async def _confirm_booking(
+        self,
+        room_name: str,
+        payloads: BookingPayloads,
+        session: aiohttp.ClientSession,
+    ):
+        """
+        Confirms and finalizes the booking for the selected room and time slots.
+
+        Args:
+            room_name: The name of the room to book.
+            payloads: The prebuilt confirm and finalize payloads.
+            session: A shared aiohttp.ClientSession whose token was used to build the payloads.
+        """
+        slot_times = ", ".join(slot["time"] for slot in payloads["slots"])
+        print(f"{MAGENTA}[*] Attempting to book{RESET} {room_name} {DIM}for {slot_times}{RESET}")
+        timeout = aiohttp.ClientTimeout(
+            total=REQUEST_TIMEOUT_SECONDS,
+            sock_connect=BOOKING_CONNECT_TIMEOUT_SECONDS,
+            sock_read=BOOKING_READ_TIMEOUT_SECONDS,
+        )
+        try:
+            async with request_scheduler.slot(Priority.BOOKING):
+                async with session.post(
+                    CONFIRM_URL, data=payloads["confirm"], timeout=timeout
+                ) as response:
+                    response.raise_for_status()
+            print(f"{CYAN}[*] Finalizing booking for {room_name}...{RESET}")
+            async with request_scheduler.slot(Priority.BOOKING):
+                async with session.post(
+                    FINALIZE_URL, data=payloads["finalize"], timeout=timeout
+                ) as response:
+                    response.raise_for_status()
+                    if response.status != 200:
+                        raise BookingException(
+                            f"Failed to finalize booking: {response.status} {await response.text()}"
+                        )
+            print(f"{GREEN}{BOLD}[+] Booking successful!{RESET} {room_name} {DIM}{slot_times}{RESET}")
+        except (aiohttp.ClientError, TimeoutError) as e:
             raise BookingException(f"Booking hours might be used up: {e}") from e
 
     async def _check_availability(self):
         """
-        checks the availability of all rooms by sending asynchronous requests using aiohttp sessions from the pool.
+        checks the availability of the planned rooms and time window by sending
+        asynchronous requests using the shared aiohttp sessions.
         """
+        plan = plan_availability_query(
+            self.mapping,
+            self.date,
+            self.default_slot_start_time,
+            self.default_slot_end_time,
+            rooms=self.rooms,
+            min_duration_minutes=self.min_duration_minutes,
+        )
+        if not plan["rsrc_ids"]:
+            print(f"{YELLOW}[*] No bookable time left in the selected window.{RESET}")
+            return
         resource_list = [
             {
-                "RSRC_ID": d["RSRC_ID"],
+                "RSRC_ID": rsrc_id,
                 "IS_SLD": False,
                 "Event_Type": 0,
                 "Disclaimer": "Sample layout",
             }
-            for d in self.rsrc_list
+            for rsrc_id in plan["rsrc_ids"]
         ]
-        aiohttp_sessions = []
-        results = []
-        try:
-            for request_session, token in self.session_pool:
-                jar = aiohttp.CookieJar()
-                for c in request_session.cookies:
-                    if c.value is not None:
-                        jar.update_cookies({c.name: c.value})
-                connector = aiohttp.TCPConnector()
-                aiohttp_sessions.append(
-                    (
-                        aiohttp.ClientSession(
-                            headers=BOOKING_HEADER, cookie_jar=jar, connector=connector
-                        ),
-                        token,
+        print(
+            f"{CYAN}[*] Querying {len(resource_list)} room(s) "
+            f"from {plan['start_time']} to {plan['end_time']}{RESET}"
+        )
+        tasks = []
+        batch_sizes = []
+        for batch_index, i in enumerate(
+            range(0, len(resource_list), AVAILABILITY_BATCH_SIZE)
+        ):
+            batch = resource_list[i : i + AVAILABILITY_BATCH_SIZE]
+            session, token = self.async_pool[batch_index % len(self.async_pool)]
+            batch_sizes.append(len(batch))
+            tasks.append(
+                create_task(
+                    self._check_availability_batch(
+                        session, token, batch, plan["start_time"], plan["end_time"]
                     )
                 )
-            tasks = []
-            for batch_index, i in enumerate(
-                range(0, len(resource_list), AVAILABILITY_BATCH_SIZE)
-            ):
-                batch = resource_list[i : i + AVAILABILITY_BATCH_SIZE]
-                session_index = batch_index % len(aiohttp_sessions)
-                session, token = aiohttp_sessions[session_index]
-                tasks.append(
-                    create_task(self._check_availability_batch(session, token, batch))
-                )
-            gathered = await gather(*tasks, return_exceptions=True)
-            results = []
-            for r in gathered:
-                if isinstance(r, BaseException):
-                    print(f"{YELLOW}[*] Availability batch failed: {r}{RESET}")
-                    continue
-                results.append(r)
-        finally:
-            await gather(*(s.close() for s, _ in aiohttp_sessions))
+            )
+        gathered = await gather(*tasks, return_exceptions=True)
+        results = []
+        response_bytes = 0
+        fetched_rooms = 0
+        for batch_size, r in zip(batch_sizes, gathered):
+            if isinstance(r, BaseException):
+                print(f"{YELLOW}[*] Availability batch failed: {r}{RESET}")
+                continue
+            batch_slots, batch_bytes = r
+            response_bytes += batch_bytes
+            fetched_rooms += batch_size
+            results.append(batch_slots)
         for batch in results:
-            self.slots.update(batch)
+            self.slots.update(
+                {
+                    room: room_slots
+                    for room, room_slots in batch.items()
+                    if has_contiguous_run(room_slots, self.min_duration_minutes)
+                }
+            )
+        saved_bytes = estimate_bytes_saved(
+            response_bytes,
+            fetched_rooms,
+            len(self.mapping),
+            plan,
+            self.default_slot_start_time,
+            self.default_slot_end_time,
+        )
+        print(
+            f"{DIM}[*] Response size {response_bytes / 1024:.1f} KB, "
+            f"skipped {plan['skipped_rooms']} room(s), "
+            f"~{saved_bytes / 1024:.1f} KB smaller than a full sweep (est.){RESET}"
+        )
 
     async def _check_availability_batch(
-        self, session: aiohttp.ClientSession, token: str, batch: list[dict[str, str]]
-    ):
+        self,
+        session: aiohttp.ClientSession,
+        token: str,
+        batch: list[dict[str, str]],
+        start_time: str,
+        end_time: str,
+    ) -> tuple[dict[str, list[dict[str, str]]], int]:
         """
         gets the availability for a batch of rooms and
-        returns a mapping of room names to available time slots.
+        returns a mapping of room names to available time slots along with the decoded response body size in bytes.
 
         Args:
             session: An aiohttp.ClientSession to use for making requests.
             token: The verification token required for making requests.
             batch: A list of dictionaries containing resource information for a batch of rooms.
+            start_time: Start of the planned time window in HH:MM format.
+            end_time: End of the planned time window in HH:MM format.
         """
         parameter = [
             {
                 "MRB002Date": self.date,
-                "MRB002StartTime": self.default_slot_start_time,
-                "MRB002EndTime": self.default_slot_end_time,
+                "MRB002StartTime": start_time,
+                "MRB002EndTime": end_time,
                 "ResourceList": batch,
             }
         ]
@@ -313,11 +485,12 @@ class Booking:
         }
         timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
         html = ""
-        async with session.post(
-            GET_ALL_ROOMS_URL, data=payload, timeout=timeout
-        ) as response:
-            response.raise_for_status()
-            html = await response.text()
+        async with request_scheduler.slot(Priority.AVAILABILITY):
+            async with session.post(
+                GET_ALL_ROOMS_URL, data=payload, timeout=timeout
+            ) as response:
+                response.raise_for_status()
+                html = await response.text()
         results = {}
 
         blocks = re.findall(AVAILABILITY_CARD_BLOCK_REGEX, html)
@@ -346,7 +519,7 @@ class Booking:
                     }
                     for s in slots
                 ]
-        return results
+        return results, len(html.encode("utf-8"))
 
     async def _build_session_pool(self):
         """Builds a pool of authenticated sessions by logging in multiple times concurrently."""
@@ -360,6 +533,17 @@ class Booking:
         ]
         self.session_pool = await gather(*creation_tasks)
 
+    def _create_async_session(self, request_session: requests.Session) -> aiohttp.ClientSession:
+        """Creates an aiohttp.ClientSession that shares the cookies of an authenticated requests.Session."""
+        jar = aiohttp.CookieJar()
+        for c in request_session.cookies:
+            if c.value is not None:
+                jar.update_cookies({c.name: c.value})
+        connector = aiohttp.TCPConnector()
+        return capture.wrap_async_session(
+            aiohttp.ClientSession(headers=BOOKING_HEADER, cookie_jar=jar, connector=connector)
+        )
+
     def _load_mapping(self):
         """
         Loads the room to resource ID mapping from a JSON file and
@@ -420,7 +604,8 @@ class Booking:
             "LocationID": "",
         }
 
-        response = session.post(BOOKING_URL, data=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+        with request_scheduler.slot_sync(Priority.AVAILABILITY):
+            response = session.post(BOOKING_URL, data=payload, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
         return response.json()
 
@@ -0,0 +1,62 @@
+"""
+Records the HTTP traffic of Auth and Booking into a gzip-compressed JSON lines archive
+and replays it through the same code paths without touching the network.
+
+Credentials, verification tokens, WS-Fed tokens and cookies are redacted before anything
+is written, while keeping every response shaped so that the existing regexes still match.
+This module only holds the hooks; the transports live in recording.py and are imported
+when recording or replay is started.
+"""
+from typing import Any
+
+_recorder = None
+_replay = None
+
+
+def start_recording(path: str):
+    """Records all traffic of sessions wrapped from now on into path."""
+    global _recorder
+    from recording import Recorder
+
+    _recorder = Recorder(path)
+
+
+def start_replay(path: str, repeat_last: bool = False):
+    """
+    Serves all traffic of sessions wrapped from now on from the recording at path.
+
+    Args:
+        path: The archive written by start_recording.
+        repeat_last: Keep serving the last response of a URL once its recording runs out,
+            instead of failing the request.
+    """
+    global _replay
+    from recording import Replay
+
+    _replay = Replay(path, repeat_last=repeat_last)
+
+
+def wrap_session(session: Any) -> Any:
+    """Attaches the active recorder or replay to a requests.Session."""
+    if _replay is not None:
+        from recording import ReplayAdapter
+
+        adapter = ReplayAdapter(_replay, _replay.next_session_id())
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    elif _recorder is not None:
+        session.hooks["response"].append(_recorder.response_hook(_recorder.next_session_id()))
+    return session
+
+
+def wrap_async_session(session: Any) -> Any:
+    """Attaches the active recorder or replay to an aiohttp.ClientSession."""
+    if _replay is not None:
+        from recording import ReplayAsyncSession
+
+        return ReplayAsyncSession(session, _replay)
+    if _recorder is not None:
+        from recording import RecordingAsyncSession
+
+        return RecordingAsyncSession(session, _recorder)
+    return session
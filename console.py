@@ -0,0 +1,59 @@
+"""Runs blocking terminal prompts without holding up the event loop or Ctrl-C."""
+from asyncio import get_running_loop
+import os
+import sys
+import threading
+from typing import Any, Callable
+
+
+def read_line(prompt: str = "") -> str:
+    """
+    input() replacement that reads stdin's file descriptor directly.
+
+    It never takes the lock of sys.stdin, so a prompt left waiting on a daemon thread
+    cannot block or abort interpreter shutdown after Ctrl-C.
+    """
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = bytearray()
+    while True:
+        char = os.read(sys.stdin.fileno(), 1)
+        if not char:
+            if not line:
+                raise EOFError
+            break
+        if char == b"\n":
+            break
+        line += char
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace").rstrip("\r")
+
+
+async def run_in_daemon_thread(func: Callable[..., Any], *args) -> Any:
+    """
+    Runs a blocking call such as read_line() on a daemon thread and awaits its result.
+
+    Unlike to_thread, the thread is not part of the default executor, so when Ctrl-C
+    cancels the awaiting task asyncio.run does not wait for the call to return.
+    """
+    loop = get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter: Callable[[Any], None], value: Any):
+        if not future.done():
+            setter(value)
+
+    def run():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+            return
+        loop.call_soon_threadsafe(settle, future.set_result, result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return await future
+
+
+async def ainput(prompt: str = "") -> str:
+    """Prompts for a line while the event loop keeps running and Ctrl-C quits immediately."""
+    return await run_in_daemon_thread(read_line, prompt)
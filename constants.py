@@ -12,7 +12,13 @@ CONFIRM_URL = "https://rbs.singaporetech.edu.sg/SRB001/NormalBookingConfirmation
 FINALIZE_URL = "https://rbs.singaporetech.edu.sg/SRB001/BookingSaving"
 SESSION_POOL_SIZE = 4
 AVAILABILITY_BATCH_SIZE = 10
+SLOT_GRID_MINUTES = 30
+SCHEDULER_RATE_PER_SECOND = 8
+SCHEDULER_BURST = 8
+SCHEDULER_MAX_IN_FLIGHT = 6
 REQUEST_TIMEOUT_SECONDS = 12
+BOOKING_CONNECT_TIMEOUT_SECONDS = 5
+BOOKING_READ_TIMEOUT_SECONDS = 10
 MAPPING_FILE = "mapping.json"
 BOOKING_HEADER = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)\
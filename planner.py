@@ -0,0 +1,140 @@
+"""
+Plans the narrowest availability query for the user's constraints, so ResourceReload
+responses only carry the rooms and time window that can actually be booked.
+"""
+from datetime import datetime, timedelta
+from typing import TypedDict
+from constants import SLOT_GRID_MINUTES
+
+TIME_FORMAT = "%H:%M"
+DATE_FORMAT = "%d %b %Y"
+
+
+def parse_rooms(raw: str | None) -> list[str]:
+    """Parses the comma-separated ROOMS setting into upper-case room names."""
+    return [room.strip().upper() for room in (raw or "").split(",") if room.strip()]
+
+
+def check_constraints(
+    mapping: dict[str, str],
+    rooms: list[str] | None,
+    start_time: str,
+    end_time: str,
+    min_duration_minutes: int,
+):
+    """
+    Validates the user's constraints before anything is sent.
+
+    Raises:
+        ValueError: when ROOMS names an unmapped room or MIN_DURATION_MINUTES
+            does not fit between the start and end time.
+    """
+    unknown = [room for room in rooms or [] if room not in mapping]
+    if unknown:
+        raise ValueError(f"Unknown room(s) in ROOMS: {', '.join(unknown)}")
+    window = datetime.strptime(end_time, TIME_FORMAT) - datetime.strptime(start_time, TIME_FORMAT)
+    if window < timedelta(minutes=min_duration_minutes):
+        raise ValueError("MIN_DURATION_MINUTES does not fit between the slot start and end time.")
+
+
+class QueryPlan(TypedDict):
+    """TypedDict to hold the narrowed availability query."""
+    start_time: str
+    end_time: str
+    rsrc_ids: list[str]
+    skipped_rooms: int
+
+
+def plan_availability_query(
+    mapping: dict[str, str],
+    booking_date: str,
+    start_time: str,
+    end_time: str,
+    rooms: list[str] | None = None,
+    min_duration_minutes: int = 0,
+    now: datetime | None = None,
+) -> QueryPlan:
+    """
+    Narrows the availability query to the requested rooms and to the part of the
+    time window that can still hold a booking.
+
+    Args:
+        mapping: Room name to resource ID mapping.
+        booking_date: The booking date in 'DD MMM YYYY' format.
+        start_time: Start of the time band in HH:MM format.
+        end_time: End of the time band in HH:MM format.
+        rooms: Room names to query, or None for every mapped room.
+        min_duration_minutes: Minimum contiguous booking length the user needs.
+        now: Current time, defaults to datetime.now().
+    """
+    check_constraints(mapping, rooms, start_time, end_time, min_duration_minutes)
+    rsrc_ids = [mapping[room] for room in rooms] if rooms else list(mapping.values())
+
+    day = datetime.strptime(booking_date, DATE_FORMAT).date()
+    start = datetime.combine(day, datetime.strptime(start_time, TIME_FORMAT).time())
+    end = datetime.combine(day, datetime.strptime(end_time, TIME_FORMAT).time())
+
+    now = now or datetime.now()
+    if start < now:
+        # slots that already started cannot be booked, so start from the next slot boundary
+        start = now.replace(second=0, microsecond=0)
+        if start < now:
+            start += timedelta(minutes=1)
+        start += timedelta(minutes=-start.minute % SLOT_GRID_MINUTES)
+    if start >= end or end - start < timedelta(minutes=min_duration_minutes):
+        rsrc_ids = []
+
+    return QueryPlan(
+        start_time=start.strftime(TIME_FORMAT) if start.date() == day else end_time,
+        end_time=end_time,
+        rsrc_ids=rsrc_ids,
+        skipped_rooms=len(mapping) - len(rsrc_ids),
+    )
+
+
+def has_contiguous_run(slots: list[dict[str, str]], min_duration_minutes: int) -> bool:
+    """
+    Checks whether back-to-back slots add up to at least min_duration_minutes.
+
+    Args:
+        slots: Slots of one room, each with a 'time' of the form 'HH:MM-HH:MM'.
+        min_duration_minutes: Minimum contiguous booking length the user needs.
+    """
+    if min_duration_minutes <= 0:
+        return bool(slots)
+    run_start = run_end = None
+    for slot in sorted(slots, key=lambda s: s["time"]):
+        slot_start, slot_end = (
+            datetime.strptime(t, TIME_FORMAT) for t in slot["time"].split("-")
+        )
+        if run_end != slot_start:
+            run_start = slot_start
+        run_end = slot_end
+        if run_end - run_start >= timedelta(minutes=min_duration_minutes):
+            return True
+    return False
+
+
+def estimate_bytes_saved(
+    response_bytes: int,
+    fetched_rooms: int,
+    total_rooms: int,
+    plan: QueryPlan,
+    full_start_time: str,
+    full_end_time: str,
+) -> int:
+    """
+    Estimates how many bytes of decoded response body the narrowed query avoided, assuming
+    response size scales with rooms times hours compared to querying every room over the
+    full time band. Compression on the wire is not accounted for.
+    """
+    def hours(start_time: str, end_time: str) -> float:
+        delta = datetime.strptime(end_time, TIME_FORMAT) - datetime.strptime(start_time, TIME_FORMAT)
+        return max(delta.total_seconds() / 3600, 0)
+
+    fetched_hours = hours(plan["start_time"], plan["end_time"])
+    if not fetched_rooms or not fetched_hours:
+        return 0
+    bytes_per_room_hour = response_bytes / (fetched_rooms * fetched_hours)
+    full_bytes = bytes_per_room_hour * total_rooms * hours(full_start_time, full_end_time)
+    return max(int(full_bytes - response_bytes), 0)
@@ -0,0 +1,301 @@
+"""
+Recorder and replay transports behind capture.py.
+
+Kept separate so that requests, aiohttp and gzip are only imported once --record or
+--replay is used. Every wrapped session gets its own numbered stream, assigned in
+creation order, so concurrent logins replay exactly the exchanges they recorded.
+"""
+import atexit
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+import gzip
+import itertools
+import json
+import re
+import threading
+from typing import Any, TypedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from yarl import URL
+from constants import REQUEST_VERIFICATION_TOKEN_REGEX, WSFED_HIDDEN_INPUT_REGEX
+
+REDACTED = "REDACTED"
+REDACTED_FIELDS = {"UserName", "Password", "__RequestVerificationToken", "wresult", "wctx"}
+REDACTED_QUERY_KEYS = {"wctx", "wresult", "client-request-id"}
+REDACTED_QUERY_REGEX = r"(?<=[?&;])(wctx|wresult|client-request-id)=[^&\"'\s<]*"
+REDACTED_INPUT_REGEX = (
+    r'<input\b[^>]*\bname="(?:' + "|".join(sorted(REDACTED_FIELDS)) + r')"[^>]*>'
+)
+INPUT_VALUE_REGEX = r'\bvalue="[^"]*"'
+DROPPED_HEADERS = {"set-cookie", "cookie"}
+
+
+class Exchange(TypedDict):
+    """TypedDict to hold one recorded request/response pair."""
+    session: int
+    method: str
+    url: str
+    request: dict[str, str]
+    status: int
+    reason: str
+    response_url: str
+    headers: dict[str, str]
+    body: str
+
+
+def _redact_fields(fields: dict[str, Any]) -> dict[str, str]:
+    return {
+        name: REDACTED if name in REDACTED_FIELDS else str(value)
+        for name, value in fields.items()
+    }
+
+
+def _redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [
+        (name, REDACTED if name in REDACTED_QUERY_KEYS else value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _redact_body(body: str) -> str:
+    body = re.sub(
+        REQUEST_VERIFICATION_TOKEN_REGEX,
+        lambda m: m.group(0).replace(m.group(1), REDACTED),
+        body,
+    )
+    body = re.sub(
+        WSFED_HIDDEN_INPUT_REGEX,
+        lambda m: m.group(0).replace(f'value="{m.group(2)}"', f'value="{REDACTED}"'),
+        body,
+    )
+    # e.g. the ADFS page of a failed login echoes the submitted UserName back
+    body = re.sub(
+        REDACTED_INPUT_REGEX,
+        lambda m: re.sub(INPUT_VALUE_REGEX, f'value="{REDACTED}"', m.group(0)),
+        body,
+    )
+    return re.sub(REDACTED_QUERY_REGEX, lambda m: f"{m.group(1)}={REDACTED}", body)
+
+
+def _redact_headers(headers) -> dict[str, str]:
+    return {
+        name: _redact_url(value) if name.lower() == "location" else value
+        for name, value in headers.items()
+        if name.lower() not in DROPPED_HEADERS
+    }
+
+
+def _form_fields(body: str | bytes | None) -> dict[str, str]:
+    if not body:
+        return {}
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    return dict(parse_qsl(body, keep_blank_values=True))
+
+
+class Recorder:
+    """Appends redacted exchanges to a gzip-compressed JSON lines archive."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._session_ids = itertools.count()
+        atexit.register(self.close)
+
+    def next_session_id(self) -> int:
+        """Numbers wrapped sessions in creation order."""
+        with self._lock:
+            return next(self._session_ids)
+
+    def add(self, exchange: Exchange):
+        """Writes one exchange to the archive."""
+        line = json.dumps(exchange, separators=(",", ":"))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self):
+        """Flushes and closes the archive."""
+        with self._lock:
+            self._file.close()
+
+    def response_hook(self, session_id: int):
+        """Builds a requests response hook that records every response, including redirects."""
+        def record_response(response: requests.Response, *args, **kwargs):
+            request = response.request
+            self.add(
+                Exchange(
+                    session=session_id,
+                    method=request.method or "GET",
+                    url=_redact_url(request.url or ""),
+                    request=_redact_fields(_form_fields(request.body)),
+                    status=response.status_code,
+                    reason=response.reason or "",
+                    response_url=_redact_url(response.url),
+                    headers=_redact_headers(response.headers),
+                    body=_redact_body(response.text),
+                )
+            )
+        return record_response
+
+
+class Replay:
+    """
+    Serves recorded exchanges per session stream in order, keyed by method and URL path.
+
+    A stream that runs out raises instead of answering, unless repeat_last is set,
+    in which case the last exchange for that URL keeps being served.
+    """
+
+    def __init__(self, path: str, repeat_last: bool = False):
+        self.path = path
+        self.repeat_last = repeat_last
+        self._exchanges: dict[tuple[int, str, str], deque[Exchange]] = defaultdict(deque)
+        self._last: dict[tuple[int, str, str], Exchange] = {}
+        self._lock = threading.Lock()
+        self._session_ids = itertools.count()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                exchange: Exchange = json.loads(line)
+                key = (exchange["session"], exchange["method"], urlsplit(exchange["url"]).path)
+                self._exchanges[key].append(exchange)
+
+    def next_session_id(self) -> int:
+        """Numbers wrapped sessions in creation order, matching the recording."""
+        with self._lock:
+            return next(self._session_ids)
+
+    def next(self, session_id: int, method: str, url: str) -> Exchange:
+        """
+        Returns the next recorded exchange of a session stream for method and URL path.
+
+        Raises:
+            LookupError: when the stream has no recorded exchange left for the URL.
+        """
+        key = (session_id, method, urlsplit(url).path)
+        with self._lock:
+            queue = self._exchanges.get(key)
+            if queue:
+                exchange = queue.popleft()
+                self._last[key] = exchange
+                return exchange
+            if self.repeat_last and key in self._last:
+                return self._last[key]
+        raise LookupError(f"Recording exhausted for session {session_id}: {method} {url}")
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport adapter that answers from a Replay instead of the network."""
+
+    def __init__(self, replay: Replay, session_id: int):
+        super().__init__()
+        self.replay = replay
+        self.session_id = session_id
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        try:
+            exchange = self.replay.next(self.session_id, request.method, request.url)
+        except LookupError as e:
+            raise requests.ConnectionError(str(e), request=request) from e
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.reason = exchange["reason"]
+        response.url = exchange["response_url"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        response.headers.pop("Content-Encoding", None)
+        response._content = exchange["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+class RecordingAsyncSession:
+    """Wraps an aiohttp.ClientSession and records every post it sends."""
+
+    def __init__(self, session: aiohttp.ClientSession, recorder: Recorder):
+        self._session = session
+        self._recorder = recorder
+        self._session_id = recorder.next_session_id()
+
+    @asynccontextmanager
+    async def post(self, url: str, data: dict[str, Any] | None = None, **kwargs):
+        """Sends the post through the wrapped session and records the response."""
+        async with self._session.post(url, data=data, **kwargs) as response:
+            body = await response.text()
+            self._recorder.add(
+                Exchange(
+                    session=self._session_id,
+                    method="POST",
+                    url=_redact_url(url),
+                    request=_redact_fields(data or {}),
+                    status=response.status,
+                    reason=response.reason or "",
+                    response_url=_redact_url(str(response.url)),
+                    headers=_redact_headers(response.headers),
+                    body=_redact_body(body),
+                )
+            )
+            yield response
+
+    async def close(self):
+        """Closes the wrapped session."""
+        await self._session.close()
+
+
+class ReplayAsyncResponse:
+    """Minimal aiohttp.ClientResponse stand-in built from a recorded exchange."""
+
+    def __init__(self, exchange: Exchange):
+        self.status = exchange["status"]
+        self.reason = exchange["reason"]
+        self.url = URL(exchange["response_url"])
+        self.headers = CIMultiDictProxy(CIMultiDict(exchange["headers"]))
+        self._body = exchange["body"]
+        self._method = exchange["method"]
+
+    def raise_for_status(self):
+        """Raises aiohttp.ClientResponseError for 4xx/5xx statuses, like aiohttp does."""
+        if self.status >= 400:
+            request_info = aiohttp.RequestInfo(self.url, self._method, self.headers, self.url)
+            raise aiohttp.ClientResponseError(
+                request_info, (), status=self.status, message=self.reason, headers=self.headers
+            )
+
+    async def text(self) -> str:
+        """Returns the recorded body."""
+        return self._body
+
+
+class ReplayAsyncSession:
+    """Stands in for an aiohttp.ClientSession and answers posts from a Replay."""
+
+    def __init__(self, session: aiohttp.ClientSession, replay: Replay):
+        self._session = session
+        self._replay = replay
+        self._session_id = replay.next_session_id()
+
+    @asynccontextmanager
+    async def post(self, url: str, data: dict[str, Any] | None = None, **kwargs):
+        """Returns the next recorded response for url."""
+        try:
+            exchange = self._replay.next(self._session_id, "POST", url)
+        except LookupError as e:
+            raise aiohttp.ClientConnectionError(str(e)) from e
+        yield ReplayAsyncResponse(exchange)
+
+    async def close(self):
+        """Closes the wrapped session, which never sent anything."""
+        await self._session.close()
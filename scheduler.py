@@ -0,0 +1,144 @@
+"""
+Central request scheduler shared by Auth and Booking.
+
+Every outgoing request waits for a slot from the scheduler, which enforces a token-bucket
+rate limit and a cap on in-flight requests, and hands out slots by priority class so
+confirm/finalize calls jump ahead of logins and availability sweeps.
+"""
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+import heapq
+import itertools
+import time
+from constants import (
+    SCHEDULER_BURST,
+    SCHEDULER_MAX_IN_FLIGHT,
+    SCHEDULER_RATE_PER_SECOND,
+)
+
+
+class Priority(IntEnum):
+    """Priority classes, lower values are served first."""
+    BOOKING = 0
+    LOGIN = 1
+    AVAILABILITY = 2
+
+
+class RequestScheduler:
+    """Token-bucket rate limiter with priority classes, running on one event loop."""
+
+    def __init__(
+        self,
+        rate_per_second: float = SCHEDULER_RATE_PER_SECOND,
+        burst: int = SCHEDULER_BURST,
+        max_in_flight: int = SCHEDULER_MAX_IN_FLIGHT,
+    ):
+        if max_in_flight < 2:
+            # one slot is always reserved for bookings, so others need at least one more
+            raise ValueError("max_in_flight must be at least 2.")
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._waiters: list[tuple[Priority, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Binds the scheduler to the event loop that threaded callers are routed through."""
+        self._loop = loop
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        """Waits for a request slot of the given priority on the running event loop."""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def slot_sync(self, priority: Priority):
+        """
+        Waits for a request slot from a worker thread, such as the to_thread logins.
+        Runs unscheduled when no event loop is bound or the caller is on the loop itself.
+        """
+        loop = self._loop
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if loop is None or loop.is_closed() or running_loop is loop:
+            yield
+            return
+        asyncio.run_coroutine_threadsafe(self._acquire(priority), loop).result()
+        try:
+            yield
+        finally:
+            self._release_threadsafe(loop)
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        # Ctrl-C may close the loop while a login thread is mid-request; there is nothing
+        # left to release then, and raising here would hide the request's own error
+        if loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass
+
+    async def _acquire(self, priority: Priority):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        waiter = self._loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was granted just before cancellation, hand it back
+                self._release()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second
+        )
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """Grants slots to the highest priority waiters while tokens and capacity allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        while self._waiters:
+            priority, _, waiter = self._waiters[0]
+            if waiter.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            # the last in-flight slot is reserved for bookings so they never queue behind a sweep
+            capacity = self.max_in_flight if priority == Priority.BOOKING else self.max_in_flight - 1
+            if self._in_flight >= capacity:
+                return
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate_per_second
+                self._timer = self._loop.call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._in_flight += 1
+            waiter.set_result(None)
+
+
+request_scheduler = RequestScheduler()